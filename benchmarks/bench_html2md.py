@@ -0,0 +1,322 @@
+# /// script
+# requires-python = ">=3.12"
+# dependencies = [
+#     "click",
+#     "html2text",
+#     "requests",
+#     "beautifulsoup4",
+# ]
+# ///
+"""Offline benchmarks for html2md.py.
+
+Generates a synthetic GitBook/Docusaurus-style documentation site, serves it from a
+local HTTP server (optionally with injected latency and errors) and runs
+GitBookCrawler.crawl and convert_local_directory against it. Every scenario runs in
+a fresh subprocess so that peak RSS is measured per scenario. Results are written as
+JSON and two result files can be compared with the `compare` command.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import click
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+WORDS = ("install configure deploy cluster token request response handler plugin "
+         "schema index cache query router session module option default value").split()
+
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def generate_site(root, pages=200, links_per_page=20, flavor="gitbook", seed=0):
+    """Write a synthetic documentation site below root/docs and return the page paths."""
+    rng = random.Random(seed)
+    sections = max(1, pages // 10)
+    paths = ["index.html"] + [f"section-{i % sections}/page-{i}.html" for i in range(1, pages)]
+    sidebar = "".join(f'<li><a href="/docs/{path}">Page {i}</a></li>' for i, path in enumerate(paths[:50]))
+
+    for i, path in enumerate(paths):
+        links = "".join(
+            f'<a href="/docs/{rng.choice(paths)}#{rng.choice(WORDS)}">{rng.choice(WORDS)}</a> '
+            for _ in range(links_per_page)
+        )
+        body = "".join(
+            f"<h2>{rng.choice(WORDS).title()} {j}</h2><p>{_sentence(rng)} <b>{rng.choice(WORDS)}</b> "
+            f"<code>{rng.choice(WORDS)}()</code> {_sentence(rng)}</p>"
+            f"<ul><li>{_sentence(rng, 5)}</li><li>{_sentence(rng, 6)}</li></ul>"
+            f"<pre><code>{rng.choice(WORDS)} = {j}\nprint({rng.choice(WORDS)})</code></pre>"
+            for j in range(rng.randint(3, 8))
+        )
+        if flavor == "docusaurus":
+            content = (f'<div class="theme-doc-markdown markdown"><header><h1>Page {i}</h1></header>'
+                       f'{body}<p>{links}</p></div>'
+                       f'<nav class="pagination-nav"><a href="/docs/{paths[(i + 1) % pages]}">Next</a></nav>')
+            html = (f'<html><head><title>Page {i}</title></head><body><nav class="navbar">Site</nav>'
+                    f'<aside class="theme-doc-sidebar-container"><ul>{sidebar}</ul></aside>'
+                    f'<main><article>{content}</article></main><footer>Footer</footer></body></html>')
+        else:
+            html = (f'<html><head><title>Page {i}</title></head><body><header>Site</header>'
+                    f'<nav><ul>{sidebar}</ul></nav><main><h1>Page {i}</h1>{body}<p>{links}</p>'
+                    f'<div class="toc">On this page</div></main><footer>Footer</footer></body></html>')
+
+        file_path = Path(root) / "docs" / path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(html, encoding="utf-8")
+    return paths
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, like real documentation hosts
+    latency = 0.0
+    error_rate = 0.0
+    rng = random.Random(0)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_site(root, latency_ms=0, error_rate=0.0):
+    """Serve root on a free localhost port; yields the base URL of the docs."""
+    handler = type("Handler", (FixtureHandler,), {"latency": latency_ms / 1000, "error_rate": error_rate,
+                                                  "rng": random.Random(0)})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/docs/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _peak_rss_bytes(who=resource.RUSAGE_SELF):
+    peak = resource.getrusage(who).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _latency_summary(latencies):
+    if not latencies:
+        return None
+    ordered = sorted(latencies)
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+    return {"mean": statistics.fmean(ordered), "p50": pct(50), "p90": pct(90), "p99": pct(99), "max": ordered[-1]}
+
+
+def _run_crawl(params, work_dir):
+    import html2md
+
+    latencies = []
+
+    class TimedCrawler(html2md.GitBookCrawler):
+        def process_page(self, url_to_process):
+            started = time.perf_counter()
+            try:
+                return super().process_page(url_to_process)
+            finally:
+                with self._lock:
+                    latencies.append(time.perf_counter() - started)
+
+    os.chdir(work_dir)
+    with serve_site(params["site"], params["latency_ms"], params["error_rate"]) as base_url:
+        runs = 2 if params["warm"] else 1
+        for _ in range(runs): # A warm run measures the second, cached crawl
+            latencies.clear()
+            crawler = TimedCrawler(base_url, "out", concurrency=params["concurrency"],
+                                   parser=params["parser"], engine=params["engine"])
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                crawler.crawl()
+            elapsed = time.perf_counter() - started
+    pages = crawler.page_count + crawler.unchanged_count
+    return {"pages": pages, "errors": crawler.error_count, "seconds": elapsed,
+            "pages_per_sec": pages / elapsed if elapsed else None, "latency": _latency_summary(latencies)}
+
+
+def _run_local(params, work_dir):
+    import html2md
+
+    site = Path(work_dir) / "site"
+    shutil.copytree(Path(params["site"]) / "docs", site)
+    latencies = []
+    if params["jobs"] == 1: # Per-file timing is only visible in-process
+        convert_local_file = html2md.convert_local_file
+        def timed_convert_local_file(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return convert_local_file(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - started)
+        html2md.convert_local_file = timed_convert_local_file
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        html2md.convert_local_directory(str(site), jobs=params["jobs"], parser=params["parser"],
+                                        engine=params["engine"])
+    elapsed = time.perf_counter() - started
+    pages = sum(1 for _ in (Path(work_dir) / "site_md").rglob("*.md"))
+    return {"pages": pages, "errors": 0, "seconds": elapsed,
+            "pages_per_sec": pages / elapsed if elapsed else None, "latency": _latency_summary(latencies)}
+
+
+def _scenario_main(params):
+    with tempfile.TemporaryDirectory(prefix="html2md-bench-") as work_dir:
+        runner = _run_crawl if params["kind"] == "crawl" else _run_local
+        result = runner(params, work_dir)
+    result["peak_rss_bytes"] = _peak_rss_bytes()
+    result["peak_rss_children_bytes"] = _peak_rss_bytes(resource.RUSAGE_CHILDREN) # --jobs workers
+    return result
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _split_csv(ctx, param, value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+@click.group()
+def cli():
+    """Benchmark html2md.py against generated, locally served documentation sites."""
+
+
+@cli.command("run")
+@click.option("--pages", default=200, show_default=True, help="Pages in the generated site.")
+@click.option("--links", "links_per_page", default=20, show_default=True, help="Content links per page.")
+@click.option("--flavor", type=click.Choice(["gitbook", "docusaurus"]), default="gitbook", show_default=True)
+@click.option("--latency-ms", default=0.0, show_default=True, help="Latency injected into every response.")
+@click.option("--error-rate", default=0.0, show_default=True, help="Fraction of requests answered with 503.")
+@click.option("--concurrency", default="1,8", show_default=True, callback=_split_csv,
+              help="Comma-separated crawl concurrency levels.")
+@click.option("--jobs", default="1,4", show_default=True, callback=_split_csv,
+              help="Comma-separated local conversion process counts.")
+@click.option("--engine", "engines", default="html2text,direct", show_default=True, callback=_split_csv,
+              help="Comma-separated conversion engines.")
+@click.option("--parser", default=None, help="HTML parser backend (default: html2md's choice).")
+@click.option("--warm", is_flag=True, help="Also measure a second crawl that can use the HTTP cache.")
+@click.option("--skip-crawl", is_flag=True, help="Only benchmark local conversion.")
+@click.option("--skip-local", is_flag=True, help="Only benchmark crawling.")
+@click.option("--output", "-o", type=click.Path(dir_okay=False), default=None,
+              help="Write the JSON results here instead of stdout.")
+def run_command(pages, links_per_page, flavor, latency_ms, error_rate, concurrency, jobs, engines, parser, warm,
+                skip_crawl, skip_local, output):
+    """Run the benchmark matrix and report pages/sec, latency percentiles and peak RSS."""
+    scenarios = []
+    for engine in engines:
+        if not skip_crawl:
+            for level in concurrency:
+                scenarios.append({"kind": "crawl", "concurrency": int(level), "engine": engine, "warm": False})
+                if warm:
+                    scenarios.append({"kind": "crawl", "concurrency": int(level), "engine": engine, "warm": True})
+        if not skip_local:
+            for count in jobs:
+                scenarios.append({"kind": "local", "jobs": int(count), "engine": engine})
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="html2md-site-") as site:
+        generate_site(site, pages, links_per_page, flavor)
+        for scenario in scenarios:
+            params = {**scenario, "site": site, "latency_ms": latency_ms, "error_rate": error_rate, "parser": parser}
+            click.echo(f"Running {json.dumps(scenario)} ...", err=True)
+            completed = subprocess.run([sys.executable, __file__, "_scenario", json.dumps(params)],
+                                       capture_output=True, text=True)
+            if completed.returncode != 0:
+                raise click.ClickException(f"Scenario {scenario} failed:\n{completed.stderr}")
+            results.append({"scenario": scenario, **json.loads(completed.stdout)})
+
+    report = {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "site": {"pages": pages, "links_per_page": links_per_page, "flavor": flavor,
+                 "latency_ms": latency_ms, "error_rate": error_rate},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        Path(output).write_text(text + "\n", encoding="utf-8")
+        click.echo(f"Results written to {output}", err=True)
+    else:
+        click.echo(text)
+
+
+@cli.command("compare")
+@click.argument("baseline", type=click.Path(exists=True, dir_okay=False))
+@click.argument("candidate", type=click.Path(exists=True, dir_okay=False))
+def compare_command(baseline, candidate):
+    """Compare two result files scenario by scenario."""
+    def load(path):
+        report = json.loads(Path(path).read_text(encoding="utf-8"))
+        return report, {json.dumps(r["scenario"], sort_keys=True): r for r in report["results"]}
+
+    base_report, base = load(baseline)
+    cand_report, cand = load(candidate)
+    click.echo(f"{base_report['revision']} -> {cand_report['revision']}")
+    for key in sorted(set(base) & set(cand)):
+        b, c = base[key], cand[key]
+        speedup = c["pages_per_sec"] / b["pages_per_sec"] if b["pages_per_sec"] and c["pages_per_sec"] else None
+        rss = c["peak_rss_bytes"] / b["peak_rss_bytes"] if b["peak_rss_bytes"] else None
+        click.echo(f"{key}: pages/sec {b['pages_per_sec']:.1f} -> {c['pages_per_sec']:.1f}"
+                   f" (x{speedup:.2f}), peak RSS x{rss:.2f}")
+
+
+@cli.command("serve")
+@click.option("--pages", default=200, show_default=True)
+@click.option("--links", "links_per_page", default=20, show_default=True)
+@click.option("--flavor", type=click.Choice(["gitbook", "docusaurus"]), default="gitbook", show_default=True)
+@click.option("--latency-ms", default=0.0, show_default=True)
+@click.option("--error-rate", default=0.0, show_default=True)
+def serve_command(pages, links_per_page, flavor, latency_ms, error_rate):
+    """Generate a site and serve it until interrupted, for manual runs of html2md.py."""
+    with tempfile.TemporaryDirectory(prefix="html2md-site-") as site:
+        generate_site(site, pages, links_per_page, flavor)
+        with serve_site(site, latency_ms, error_rate) as base_url:
+            click.echo(f"Serving {pages} pages at {base_url} (Ctrl-C to stop)")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "_scenario":
+        print(json.dumps(_scenario_main(json.loads(sys.argv[2]))))
+    else:
+        cli()
@@ -10,25 +10,841 @@
 
 import os
 import re
+import bisect
+import string
+import json
 import time
+import heapq
+import random
+import contextlib
+import hashlib
+import sqlite3
+import threading
 import click
 import html2text
 import requests
+from collections import deque
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+import soupsieve
+from bs4 import BeautifulSoup, Tag, NavigableString
+from bs4.builder import builder_registry
+from bs4.element import CData, Comment, Declaration, Doctype, ProcessingInstruction
+from html2text.utils import escape_md, escape_md_section, hn, list_numbering_start
+
+
+HTML2TEXT_SETTINGS = {
+    "ignore_links": False,
+    "ignore_images": False, # Images are linked, not embedded
+    "ignore_tables": False,
+    "body_width": 0,  # No wrapping
+    "unicode_snob": True,
+    "mark_code": True,
+}
+
+# Candidates for a page's main content, in order of preference
+MAIN_CONTENT_SELECTORS = [
+    'main',
+    'article',
+    'div[role="main"]',
+    'div.main-content',
+    'div.content',
+    'div.page-content',
+    'div.DocSearch-content' # Common in Docusaurus/GitBook like
+]
+
+# Common unwanted elements removed from the main content of crawled pages
+UNWANTED_SELECTORS = [
+    "nav", "header", "footer", "aside", ".sidebar", ".toc",
+    ".edit-page-link", "div.theme-doc-markdown header", ".navbar",
+    "div[class*='breadcrumb']", "div[class*='pagination']",
+    "button[aria-label='collapse']" # GitBook theme specific
+]
+
+# Elements dropped from local files before conversion
+LOCAL_UNWANTED_SELECTORS = ["nav", "header", "footer", "aside"]
+
+# Selector lists are compiled once so that every element is tested against all of them
+# in a single walk instead of one tree traversal per selector.
+_MAIN_CONTENT_PATTERNS = [soupsieve.compile(selector) for selector in MAIN_CONTENT_SELECTORS]
+_ANY_MAIN_CONTENT_PATTERN = soupsieve.compile(", ".join(MAIN_CONTENT_SELECTORS))
+_UNWANTED_PATTERN = soupsieve.compile(", ".join(UNWANTED_SELECTORS))
+_LOCAL_UNWANTED_PATTERN = soupsieve.compile(", ".join(LOCAL_UNWANTED_SELECTORS))
+
+# BeautifulSoup tree builders, fastest first. html5lib is the most lenient but also the
+# slowest, so it is only used when asked for explicitly.
+PARSER_BACKENDS = ["lxml", "html.parser", "html5lib"]
+
+# "html2text" serializes the pruned element and lets html2text parse it again;
+# "direct" writes Markdown from the parsed tree with MarkdownEmitter.
+CONVERSION_ENGINES = ["html2text", "direct"]
+
+
+def default_parser():
+    for parser in PARSER_BACKENDS[:2]:
+        if builder_registry.lookup(parser):
+            return parser
+    return "html.parser"
+
+
+def remove_matching_elements(root, pattern):
+    # Collect all matching descendants in one walk, then drop them (nested matches go with their ancestor)
+    matches = [node for node in root.descendants if isinstance(node, Tag) and pattern.match(node)]
+    for element in matches:
+        if not element.decomposed:
+            element.decompose()
+
+
+def make_html2text_converter():
+    converter = html2text.HTML2Text()
+    for setting, value in HTML2TEXT_SETTINGS.items():
+        setattr(converter, setting, value)
+    return converter
+
+
+@contextlib.contextmanager
+def stage_timer(timings, stage):
+    # Adds the time spent in the block to timings[stage]
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+class RunStats:
+    """Per-stage timing histograms, byte counts, error breakdown and the slowest pages of a run."""
+
+    HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+    def __init__(self, slowest=20):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.errors = {}
+        self.slowest = slowest
+        self._slowest_heap = [] # Min-heap of (seconds, sequence, name, timings)
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def record_page(self, name, seconds, timings):
+        with self._lock:
+            for stage, duration in timings.items():
+                entry = self.stages.get(stage)
+                if entry is None:
+                    entry = self.stages[stage] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                                                  "histogram": [0] * (len(self.HISTOGRAM_BOUNDS_MS) + 1)}
+                entry["count"] += 1
+                entry["total_seconds"] += duration
+                entry["max_seconds"] = max(entry["max_seconds"], duration)
+                entry["histogram"][bisect.bisect_left(self.HISTOGRAM_BOUNDS_MS, duration * 1000)] += 1
+
+            self._sequence += 1
+            item = (seconds, self._sequence, name, dict(timings))
+            if len(self._slowest_heap) < self.slowest:
+                heapq.heappush(self._slowest_heap, item)
+            elif seconds > self._slowest_heap[0][0]:
+                heapq.heapreplace(self._slowest_heap, item)
+
+    def count(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def record_error(self, kind):
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def as_dict(self, **summary):
+        labels = [f"<={bound}ms" for bound in self.HISTOGRAM_BOUNDS_MS] + [f">{self.HISTOGRAM_BOUNDS_MS[-1]}ms"]
+        with self._lock:
+            stages = {}
+            for stage, entry in self.stages.items():
+                stages[stage] = {
+                    "count": entry["count"],
+                    "total_seconds": entry["total_seconds"],
+                    "mean_seconds": entry["total_seconds"] / entry["count"],
+                    "max_seconds": entry["max_seconds"],
+                    "histogram": {label: n for label, n in zip(labels, entry["histogram"]) if n},
+                }
+            slowest = [{"name": name, "seconds": seconds, "stages": timings}
+                       for seconds, _, name, timings in sorted(self._slowest_heap, reverse=True)]
+            return {**summary, "wall_seconds": time.perf_counter() - self.started, "counters": dict(self.counters),
+                    "errors": dict(self.errors), "stages": stages, "slowest": slowest}
+
+    def write_json(self, path, **summary):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(**summary), f, indent=2)
+            f.write("\n")
+
+
+class MarkdownEmitter:
+    """Writes Markdown straight from an already parsed and pruned BeautifulSoup element.
+
+    This is the "direct" conversion engine. It follows the tag handling and whitespace
+    rules of html2text.HTML2Text configured with HTML2TEXT_SETTINGS, so both engines
+    produce interchangeable output. The difference is that it skips serializing the
+    element with str() and having html2text tokenize the copy again.
+    """
+
+    QUIET_TAGS = ("head", "style", "script")
+    SKIPPED_STRINGS = (Comment, Declaration, Doctype, CData, ProcessingInstruction)
+    ABSOLUTE_URL = re.compile(r"^[a-zA-Z+]+://")
+    # str() re-encodes these characters, and html2text then receives them as entity
+    # references, which it never escapes. They are split off to get the same result.
+    ENTITY_CHARS = re.compile(r"([&<>])")
+    WHITESPACE = re.compile(r"\s+")
+
+    def __init__(self):
+        self.outtextlist = []
+        self.quiet = 0
+        self.p_p = 0
+        self.start = True
+        self.space = False
+        self.lastWasNL = False
+        self.br_toggle = ""
+        self.blockquote = 0
+        self.pre = False
+        self.startpre = False
+        self.code = False
+        self.quote = False
+        self.lists = []
+        self.lastWasList = False
+        self.list_code_indent = ""
+        self.astack = []
+        self.maybe_automatic_link = None
+        self.empty_link = False
+        self.inheader = False
+        self.stressed = False
+        self.preceding_stressed = False
+        self.preceding_data = ""
+        self.current_tag = ""
+        self.table_start = False
+        self.split_next_td = False
+        self.td_count = 0
+        self.abbr_title = None
+        self.abbr_data = None
+        self.abbr_list = {}
+
+    def convert(self, element):
+        # Iterative walk so that deeply nested pages cannot exhaust the recursion limit
+        stack = [(element, True)]
+        while stack:
+            node, entering = stack.pop()
+            if isinstance(node, Tag):
+                attrs = node.attrs
+                if entering:
+                    self.handle_tag(node.name, attrs, True)
+                    stack.append((node, False))
+                    stack.extend((child, True) for child in reversed(node.contents))
+                else:
+                    self.handle_tag(node.name, attrs, False)
+            elif isinstance(node, NavigableString) and not isinstance(node, self.SKIPPED_STRINGS):
+                for index, part in enumerate(self.ENTITY_CHARS.split(node)):
+                    if part:
+                        self.handle_data(part, entity_char=index % 2 == 1)
+
+        self.pbr()
+        self.o("", force="end")
+        return "".join(self.outtextlist)
+
+    def out(self, text):
+        self.outtextlist.append(text)
+        if text:
+            self.lastWasNL = text[-1] == "\n"
+
+    def pbr(self):
+        if self.p_p == 0:
+            self.p_p = 1
+
+    def p(self):
+        self.p_p = 2
+
+    def soft_br(self):
+        self.pbr()
+        self.br_toggle = "  "
+
+    def o(self, data, puredata=False, force=False):
+        if self.abbr_data is not None:
+            self.abbr_data += data
+        if self.quiet:
+            return
+
+        if puredata and not self.pre:
+            data = self.WHITESPACE.sub(" ", data)
+            if data and data[0] == " ":
+                self.space = True
+                data = data[1:]
+        if not data and not force:
+            return
+
+        if self.startpre:
+            if not data.startswith("\n") and not data.startswith("\r\n"):
+                data = "\n" + data
+            self.out("\n[code]") # mark_code
+            self.p_p = 0
+
+        bq = ">" * self.blockquote
+        if not (force and data and data[0] == ">") and self.blockquote:
+            bq += " "
+
+        if self.pre:
+            if self.lists:
+                bq += self.list_code_indent
+            bq += "    "
+            data = data.replace("\n", "\n" + bq)
+
+        if self.startpre:
+            self.startpre = False
+            if self.lists:
+                data = data.lstrip("\n" + bq) # Use the existing initial indentation
+
+        if self.start:
+            self.space = False
+            self.p_p = 0
+            self.start = False
+
+        if force == "end":
+            self.p_p = 0
+            self.out("\n")
+            self.space = False
+
+        if self.p_p:
+            self.out((self.br_toggle + "\n" + bq) * self.p_p)
+            self.space = False
+            self.br_toggle = ""
+
+        if self.space:
+            if not self.lastWasNL:
+                self.out(" ")
+            self.space = False
+
+        if self.abbr_list and force == "end":
+            for abbr, definition in self.abbr_list.items():
+                self.out("  *[" + abbr + "]: " + definition + "\n")
+
+        self.p_p = 0
+        self.out(data)
+
+    def handle_data(self, data, entity_char=False):
+        if self.stressed:
+            data = data.strip()
+            self.stressed = False
+            self.preceding_stressed = True
+        elif self.preceding_stressed:
+            if re.match(r"[^][(){}\s.!?]", data[0]) and not hn(self.current_tag) \
+               and self.current_tag not in ("a", "code", "pre"):
+                data = " " + data # Should match a letter or common punctuation
+            self.preceding_stressed = False
+
+        if self.maybe_automatic_link is not None:
+            href = self.maybe_automatic_link
+            if href == data and self.ABSOLUTE_URL.match(href):
+                self.o("<" + data + ">")
+                self.empty_link = False
+                return
+            self.o("[")
+            self.maybe_automatic_link = None
+            self.empty_link = False
+
+        if not self.code and not self.pre and not entity_char:
+            data = escape_md_section(data)
+        self.preceding_data = data
+        self.o(data, puredata=True)
+
+    def handle_tag(self, tag, attrs, start):
+        self.current_tag = tag
+
+        # The first thing inside a link is another tag that produces output
+        if start and self.maybe_automatic_link is not None \
+           and tag not in ("p", "div", "style", "dl", "dt", "img"):
+            self.o("[")
+            self.maybe_automatic_link = None
+            self.empty_link = False
+
+        level = hn(tag)
+        if level:
+            if self.astack: # Heading inside a link (invalid, but found in the wild)
+                if start:
+                    self.inheader = True
+                    if self.outtextlist and self.outtextlist[-1] == "[":
+                        self.outtextlist.pop()
+                        self.space = False
+                        self.o(level * "#" + " ")
+                        self.o("[")
+                else:
+                    self.p_p = 0
+                    self.inheader = False
+                    return
+            else:
+                self.p()
+                if start:
+                    self.inheader = True
+                    self.o(level * "#" + " ")
+                else:
+                    self.inheader = False
+                    return
+
+        if tag in ("p", "div") and not self.astack and not self.split_next_td:
+            self.p()
+
+        if tag == "br" and start:
+            self.o("  \n> " if self.blockquote > 0 else "  \n")
+
+        if tag == "hr" and start:
+            self.p()
+            self.o("* * *")
+            self.p()
+
+        if tag in self.QUIET_TAGS:
+            self.quiet += 1 if start else -1
+        if tag == "body":
+            self.quiet = 0
+
+        if tag == "blockquote":
+            if start:
+                self.p()
+                self.o("> ", force=True)
+                self.start = True
+                self.blockquote += 1
+            else:
+                self.blockquote -= 1
+                self.p()
+
+        if tag in ("em", "i", "u"):
+            # Keep emphasis marks from sticking to a preceding word
+            if start and self.preceding_data and self.preceding_data[-1] not in string.whitespace \
+               and self.preceding_data[-1] not in string.punctuation:
+                emphasis = " _"
+                self.preceding_data += " "
+            else:
+                emphasis = "_"
+            self.o(emphasis)
+            if start:
+                self.stressed = True
+
+        if tag in ("strong", "b"):
+            if start and self.preceding_data and self.preceding_data[-1] == "*":
+                strong = " **"
+                self.preceding_data += " "
+            else:
+                strong = "**"
+            self.o(strong)
+            if start:
+                self.stressed = True
+
+        if tag in ("del", "strike", "s"):
+            if start and self.preceding_data and self.preceding_data[-1] == "~":
+                strike = " ~~"
+                self.preceding_data += " "
+            else:
+                strike = "~~"
+            self.o(strike)
+            if start:
+                self.stressed = True
+
+        if tag in ("kbd", "code", "tt") and not self.pre:
+            self.o("`")
+            self.code = not self.code
+
+        if tag == "abbr":
+            if start:
+                self.abbr_title = attrs.get("title")
+                self.abbr_data = ""
+            else:
+                if self.abbr_title is not None:
+                    self.abbr_list[self.abbr_data] = self.abbr_title
+                    self.abbr_title = None
+                self.abbr_data = None
+
+        if tag == "q":
+            self.o('"')
+            self.quote = not self.quote
+
+        if tag == "a":
+            if start:
+                href = attrs.get("href")
+                if href is not None and not href.startswith("#"):
+                    self.astack.append(attrs)
+                    self.maybe_automatic_link = href
+                    self.empty_link = True
+                else:
+                    self.astack.append(None)
+            elif self.astack:
+                a = self.astack.pop()
+                if self.maybe_automatic_link and not self.empty_link:
+                    self.maybe_automatic_link = None
+                elif a:
+                    if self.empty_link:
+                        self.o("[")
+                        self.empty_link = False
+                        self.maybe_automatic_link = None
+                    self.p_p = 0
+                    title = escape_md(a.get("title") or "")
+                    title = ' "{}"'.format(title) if title.strip() else ""
+                    self.o("]({}{})".format(escape_md(a["href"]), title))
+
+        if tag == "img" and start and attrs.get("src") is not None:
+            alt = attrs.get("alt") or ""
+            if self.maybe_automatic_link is not None:
+                self.o("[")
+                self.maybe_automatic_link = None
+                self.empty_link = False
+            self.o("![" + escape_md(alt) + "]")
+            self.o("(" + escape_md(attrs["src"]) + ")")
+
+        if tag == "dl" and start:
+            self.p()
+        if tag == "dt" and not start:
+            self.pbr()
+        if tag == "dd":
+            if start:
+                self.o("    ")
+            else:
+                self.pbr()
+
+        if tag in ("ol", "ul"):
+            if not self.lists and not self.lastWasList:
+                self.p()
+            if start:
+                self.lists.append([tag, list_numbering_start(attrs)])
+            elif self.lists:
+                self.lists.pop()
+                if not self.lists:
+                    self.o("\n")
+            self.lastWasList = True
+        else:
+            self.lastWasList = False
+
+        if tag == "li":
+            self.list_code_indent = ""
+            self.pbr()
+            if start:
+                li = self.lists[-1] if self.lists else ["ul", 0]
+                # Two spaces per list level, three for an unordered list inside an ordered one
+                parent_list = None
+                for list_name, _ in self.lists:
+                    self.list_code_indent += "   " if parent_list == "ol" else "  "
+                    parent_list = list_name
+                self.o(self.list_code_indent)
+                if li[0] == "ul":
+                    self.list_code_indent += "  "
+                    self.o("* ")
+                else:
+                    li[1] += 1
+                    self.list_code_indent += "   "
+                    self.o(str(li[1]) + ". ")
+                self.start = True
+
+        if tag == "table":
+            if start:
+                self.table_start = True
+        if tag in ("td", "th") and start:
+            if self.split_next_td:
+                self.o("| ")
+            self.split_next_td = True
+            self.td_count += 1
+        if tag == "tr":
+            if start:
+                self.td_count = 0
+            else:
+                self.split_next_td = False
+                self.soft_br()
+                if self.table_start: # Underline the header row
+                    self.o("|".join(["---"] * self.td_count))
+                    self.soft_br()
+                    self.table_start = False
+
+        if tag == "pre":
+            if start:
+                self.startpre = True
+                self.pre = True
+            else:
+                self.pre = False
+                self.out("\n[/code]") # mark_code
+            self.p()
+
+
+class HttpCache:
+    """Per-URL validators (ETag/Last-Modified), body hash and outbound links from the last crawl.
+
+    Entries that are not seen again during a completed crawl are dropped by compact(),
+    so the cache only ever holds the pages of the most recent run.
+    """
+
+    COMMIT_EVERY = 50
+
+    def __init__(self, path):
+        self.path = path
+        self.run_started = time.time()
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body_hash TEXT, "
+            "rel_path TEXT, links TEXT, last_seen REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body_hash, rel_path, links FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, body_hash, rel_path, links = row
+        return {"etag": etag, "last_modified": last_modified, "body_hash": body_hash,
+                "rel_path": rel_path, "links": json.loads(links)}
+
+    def store(self, url, etag, last_modified, body_hash, rel_path, links):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body_hash, rel_path, json.dumps(links), time.time()),
+            )
+            self._maybe_commit()
+
+    def touch(self, url):
+        with self._lock:
+            self._conn.execute("UPDATE pages SET last_seen = ? WHERE url = ?", (time.time(), url))
+            self._maybe_commit()
+
+    def _maybe_commit(self):
+        self._pending_writes += 1
+        if self._pending_writes >= self.COMMIT_EVERY:
+            self._conn.commit()
+            self._pending_writes = 0
+
+    def compact(self):
+        """Drop entries for pages that were not reached by the run that just finished."""
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM pages WHERE last_seen < ?", (self.run_started,)).rowcount
+            self._conn.commit()
+            if removed:
+                self._conn.execute("VACUUM")
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+class HostRateLimiter:
+    """Per-host token buckets whose request rate adapts to how each server responds.
+
+    The rate grows by RATE_GROWTH per fast response, up to max_rps, and is halved when a server
+    answers slowly or throttles (429/503). A Retry-After pause blocks the host entirely.
+    """
+
+    MIN_RPS = 0.2
+    RATE_GROWTH = 1.1 # Factor applied to the rate after each fast response
+    SLOW_RESPONSE = 2.0 # Seconds; slower responses count as a sign of overload
+
+    def __init__(self, max_rps):
+        self.max_rps = max_rps
+        self.initial_rps = min(max_rps, 10.0) # The fixed 0.1 s delay this replaces
+        self._hosts = {} # host -> {"rate", "tokens", "updated", "blocked_until"}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host, now):
+        bucket = self._hosts.get(host)
+        if bucket is None:
+            bucket = self._hosts[host] = {"rate": self.initial_rps, "tokens": 1.0, "updated": now,
+                                          "blocked_until": 0.0}
+        else:
+            # Refill, allowing a burst of up to one second's worth of requests
+            capacity = max(1.0, bucket["rate"])
+            bucket["tokens"] = min(capacity, bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"])
+            bucket["updated"] = now
+        return bucket
+
+    def acquire(self, host):
+        # Blocks until a request to host may be sent
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                bucket = self._bucket(host, now)
+                if now < bucket["blocked_until"]:
+                    delay = bucket["blocked_until"] - now
+                elif bucket["tokens"] >= 1.0:
+                    bucket["tokens"] -= 1.0
+                    return
+                else:
+                    delay = (1.0 - bucket["tokens"]) / bucket["rate"]
+            time.sleep(delay)
+
+    def on_response(self, host, elapsed):
+        with self._lock:
+            bucket = self._bucket(host, time.monotonic())
+            if elapsed > self.SLOW_RESPONSE:
+                bucket["rate"] = max(self.MIN_RPS, bucket["rate"] / 2)
+            else:
+                bucket["rate"] = min(self.max_rps, bucket["rate"] * self.RATE_GROWTH)
+
+    def on_throttle(self, host, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(host, now)
+            bucket["rate"] = max(self.MIN_RPS, bucket["rate"] / 2)
+            bucket["tokens"] = min(bucket["tokens"], 0.0)
+            if retry_after:
+                bucket["blocked_until"] = max(bucket["blocked_until"], now + retry_after)
+
+    def rates(self):
+        with self._lock:
+            return {host: bucket["rate"] for host, bucket in self._hosts.items()}
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date; returns seconds or None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class CrawlFrontier:
+    """Breadth-first crawl state: a deque of URLs to fetch plus the visited set.
+
+    With a log path, every change is appended to a JSON-lines log that is flushed at
+    each checkpoint, so an interrupted crawl can be replayed and resumed. Queued URLs
+    stay in `queued` until done() is called, so pages that were in flight when the
+    crawl stopped are fetched again on resume.
+    """
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self.queue = deque()
+        self.queued = set()
+        self.visited = set()
+        self.counters = {}
+        self.started = time.time()
+        self._log_lines = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, log_path, base_url):
+        frontier = cls(log_path)
+        pending = {} # Insertion-ordered: URLs queued but not yet done
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    kind, value = json.loads(line)
+                except ValueError:
+                    break # Torn final line from a hard crash
+                if kind == "B":
+                    if value["base_url"] != base_url:
+                        raise click.ClickException(
+                            f"Crawl state in {log_path} belongs to {value['base_url']}, not {base_url}.")
+                    frontier.started = value["started"]
+                elif kind == "Q":
+                    pending[value] = True
+                elif kind == "D":
+                    pending.pop(value, None)
+                elif kind == "V":
+                    frontier.visited.add(value)
+                elif kind == "S":
+                    frontier.counters = value
+        frontier.queue.extend(pending)
+        frontier.queued.update(pending)
+        return frontier
+
+    def start_log(self, base_url):
+        # Truncate any previous state and record what this log belongs to
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(["B", {"base_url": base_url, "started": self.started}]) + "\n")
+
+    def _log(self, kind, value):
+        if self.log_path:
+            with self._lock:
+                self._log_lines.append(json.dumps([kind, value]))
+
+    def push(self, url):
+        if url in self.queued or url in self.visited:
+            return False
+        self.queue.append(url)
+        self.queued.add(url)
+        self._log("Q", url)
+        return True
+
+    def pop(self):
+        return self.queue.popleft()
+
+    def done(self, url):
+        self.queued.discard(url)
+        self._log("D", url)
+
+    def mark_visited(self, url):
+        self.visited.add(url)
+        self._log("V", url)
+
+    def checkpoint(self, counters):
+        if not self.log_path:
+            return
+        with self._lock:
+            self._log_lines.append(json.dumps(["S", counters]))
+            lines, self._log_lines = self._log_lines, []
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def discard_log(self):
+        if self.log_path and self.log_path.exists():
+            self.log_path.unlink()
+
+    def __len__(self):
+        return len(self.queue)
 
 
 class GitBookCrawler:
-    def __init__(self, base_url, folder_name, verbose=False, dry_run=False):
+    def __init__(self, base_url, folder_name, verbose=False, dry_run=False, concurrency=1, max_per_host=None,
+                 refresh=False, resume=False, checkpoint_every=100, parser=None, engine="html2text",
+                 stats_json=None, max_rps=20.0, max_retries=4):
         self.base_url_original = base_url
         self.output_dir = Path.cwd() / folder_name
         self.verbose = verbose
         self.dry_run = dry_run
-        self.visited_urls = set()
         self.page_count = 0
         self.error_count = 0
+        self.unchanged_count = 0
         self.progress_started = False # For standard mode progress dots
+        self.concurrency = max(1, concurrency)
+        self.refresh = refresh
+        self.resume = resume
+        self.parser = parser or default_parser()
+        self.engine = engine
+        self.stats_json = stats_json
+        self.stats = RunStats()
+        self.checkpoint_every = checkpoint_every
+        self.max_retries = max_retries
+        self.rate_limiter = HostRateLimiter(max_rps)
+
+        # Shared state (visited set, counters, progress output) is guarded by this lock
+        # so that process_page can run on several worker threads at once.
+        self._lock = threading.RLock()
+        self._thread_local = threading.local()
+
+        # Pooled keep-alive connections. pool_block caps the open connections per host.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_maxsize=max_per_host or self.concurrency, pool_block=True
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
         # Normalize self.base_url_for_startswith_check and self.normalized_base_url_path
         parsed_b_url = urlparse(base_url)
@@ -69,26 +885,53 @@ class GitBookCrawler:
         self.normalized_base_url_path = temp_normalized_path
         self.base_url_for_startswith_check = temp_startswith_url
 
-        # Configure html2text
-        self.converter = html2text.HTML2Text()
-        self.converter.ignore_links = False
-        self.converter.ignore_images = False # Images are linked, not embedded
-        self.converter.ignore_tables = False
-        self.converter.body_width = 0  # No wrapping
-        self.converter.unicode_snob = True
-        self.converter.mark_code = True
-
         if not dry_run and not self.output_dir.exists():
             self.output_dir.mkdir(parents=True, exist_ok=True)
 
+        # The HTTP cache lives next to the output folder; dry runs neither read nor write it
+        self.cache = None
+        if not dry_run:
+            self.cache = HttpCache(self.output_dir.parent / f".{self.output_dir.name}.cache.sqlite")
+
+        # Crawl state is checkpointed next to the output folder too, so the crawl can be resumed
+        state_path = None if dry_run else self.output_dir.parent / f".{self.output_dir.name}.crawl-state.jsonl"
+        if resume and state_path and state_path.exists():
+            self.frontier = CrawlFrontier.load(state_path, self.base_url_for_startswith_check)
+            self.page_count = self.frontier.counters.get("pages", 0)
+            self.error_count = self.frontier.counters.get("errors", 0)
+            self.unchanged_count = self.frontier.counters.get("unchanged", 0)
+            # Pages cached before the interruption belong to this run too and must survive compaction
+            self.cache.run_started = self.frontier.started
+        else:
+            self.frontier = CrawlFrontier(state_path)
+            if state_path:
+                self.frontier.start_log(self.base_url_for_startswith_check)
+            self.frontier.push(self.base_url_for_startswith_check)
+        self.visited_urls = self.frontier.visited
+
+    @property
+    def converter(self):
+        # HTML2Text keeps parser state on the instance, so each worker thread gets its own
+        converter = getattr(self._thread_local, "converter", None)
+        if converter is None:
+            converter = self._thread_local.converter = make_html2text_converter()
+        return converter
+
     def _log_verbose(self, message, **kwargs):
         if self.verbose:
             click.secho(message, **kwargs)
 
     def _log_standard_progress(self, char_code, final_newline=False):
-        if not self.verbose:
+        if self.verbose:
+            return
+        with self._lock:
             if not self.progress_started:
-                prefix = "Dry-run: Processing pages (o = would save): " if self.dry_run else "Processing pages (. = saved): "
+                if self.dry_run:
+                    prefix = "Dry-run: Processing pages (o = would save): "
+                elif self.cache:
+                    prefix = "Processing pages (. = saved, - = unchanged): "
+                else:
+                    prefix = "Processing pages (. = saved): "
                 click.echo(prefix, nl=False)
                 self.progress_started = True
             click.echo(char_code, nl=False)
@@ -98,10 +941,11 @@ class GitBookCrawler:
 
 
     def _log_error(self, message):
-        if not self.verbose and self.progress_started:
-            click.echo() # Newline to separate error from progress dots
-            self.progress_started = False # Reset for next potential progress line
-        click.secho(message, fg="red", err=True)
+        with self._lock:
+            if not self.verbose and self.progress_started:
+                click.echo() # Newline to separate error from progress dots
+                self.progress_started = False # Reset for next potential progress line
+            click.secho(message, fg="red", err=True)
 
 
     def clean_filename_component(self, filename_component):
@@ -121,36 +965,33 @@ class GitBookCrawler:
         return "Unnamed Page"
 
     def extract_content(self, soup):
-        main_content_selectors = [
-            'main',
-            'article',
-            'div[role="main"]',
-            'div.main-content',
-            'div.content',
-            'div.page-content',
-            'div.DocSearch-content' # Common in Docusaurus/GitBook like
-        ]
-        main_content = None
-        for selector in main_content_selectors:
-            main_content = soup.select_one(selector)
-            if main_content:
-                break
-
+        return str(self.select_content(soup))
+
+    def select_content(self, soup):
+        # One walk over the document records the first match of every main-content selector
+        # and every unwanted element; the preferred main content is picked afterwards.
+        main_matches = [None] * len(_MAIN_CONTENT_PATTERNS)
+        unwanted_elements = []
+        for node in soup.descendants:
+            if not isinstance(node, Tag):
+                continue
+            if _ANY_MAIN_CONTENT_PATTERN.match(node):
+                for index, pattern in enumerate(_MAIN_CONTENT_PATTERNS):
+                    if main_matches[index] is None and pattern.match(node):
+                        main_matches[index] = node
+            if _UNWANTED_PATTERN.match(node):
+                unwanted_elements.append(node)
+
+        main_content = next((match for match in main_matches if match is not None), None)
         target_element = main_content if main_content else soup.body
-        if not target_element: return str(soup)
-
-        # Remove common unwanted elements
-        unwanted_selectors = [
-            "nav", "header", "footer", "aside", ".sidebar", ".toc",
-            ".edit-page-link", "div.theme-doc-markdown header", ".navbar",
-            "div[class*='breadcrumb']", "div[class*='pagination']",
-            "button[aria-label='collapse']" # GitBook theme specific
-        ]
-        for selector in unwanted_selectors:
-            for element in target_element.select(selector):
+        if not target_element: return soup
+
+        # Remove common unwanted elements inside the main content
+        for element in unwanted_elements:
+            if not element.decomposed and any(parent is target_element for parent in element.parents):
                 element.decompose()
 
-        return str(target_element)
+        return target_element
 
 
     def determine_path_from_url(self, url):
@@ -193,142 +1034,447 @@ class GitBookCrawler:
 
         return Path(*cleaned_directories) / cleaned_filename
 
+    def extract_links(self, soup, page_url):
+        # All in-scope links of a page, cleaned of query and fragment, in document order
+        page_links = []
+        for link_tag in soup.find_all('a', href=True):
+            href_value = link_tag['href']
+            if not href_value or href_value.startswith(('#', 'javascript:', 'mailto:')) or \
+               any(ext in href_value.lower() for ext in [
+                   '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico',
+                   '.pdf', '.zip', '.tar.gz', '.tgz', '.rar', '.7z',
+                   '.css', '.js', '.json', '.xml', '.txt',
+                   '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+                   '.mp4', '.webm', '.ogg', '.mp3', '.wav', '.avi', '.mov',
+                   '.woff', '.woff2', '.ttf', '.otf', '.eot'
+               ]):
+                continue
+
+            abs_href = urljoin(page_url, href_value) # Resolve relative to the page's final URL
+            parsed_abs_href = urlparse(abs_href)
+            clean_abs_href = parsed_abs_href._replace(fragment="", query="").geturl()
+
+            if clean_abs_href.startswith(self.base_url_for_startswith_check):
+                page_links.append(clean_abs_href) # Add clean URL to queue
+        return page_links
+
+    # Responses worth retrying: throttling and transient server or gateway failures
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    THROTTLE_STATUSES = {429, 503}
+    BACKOFF_BASE = 0.5
+    BACKOFF_CAP = 30.0
+    RETRY_AFTER_CAP = 300.0
+
+    def _fetch(self, url, headers, timings):
+        # GET through the per-host rate limiter, retrying transient failures with jittered backoff
+        host = urlparse(url).netloc
+        for attempt in range(self.max_retries + 1):
+            with stage_timer(timings, "throttle"):
+                self.rate_limiter.acquire(host)
+            started = time.monotonic()
+            try:
+                with stage_timer(timings, "fetch"):
+                    response = self.session.get(url, headers=headers, timeout=15) # Increased timeout
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                if isinstance(e, requests.exceptions.Timeout): # A refused connection says nothing about load
+                    self.rate_limiter.on_throttle(host)
+                reason, retry_after = type(e).__name__, None
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    self.rate_limiter.on_response(host, time.monotonic() - started)
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is not None:
+                    retry_after = min(retry_after, self.RETRY_AFTER_CAP)
+                if response.status_code in self.THROTTLE_STATUSES:
+                    self.rate_limiter.on_throttle(host, retry_after)
+                if attempt == self.max_retries:
+                    return response # raise_for_status reports it
+                reason = f"HTTP {response.status_code}"
+
+            # Full jitter keeps workers that failed together from retrying in lockstep
+            delay = random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            self.stats.count("retries")
+            self._log_verbose(f"{reason} for {url}; retry {attempt + 1}/{self.max_retries} in {delay:.1f}s",
+                              fg="yellow")
+            with stage_timer(timings, "throttle"):
+                time.sleep(delay)
+
     def process_page(self, url_to_process):
+        timings = {}
+        started = time.perf_counter()
+        try:
+            return self._process_page(url_to_process, timings)
+        finally:
+            if timings: # Nothing was timed for URLs that had already been visited
+                self.stats.record_page(url_to_process, time.perf_counter() - started, timings)
+
+    def _process_page(self, url_to_process, timings):
         # Use a consistent, clean URL (no fragment/query) for visited checks
         parsed_url = urlparse(url_to_process)
         clean_url_for_visited = parsed_url._replace(fragment="", query="").geturl()
 
-        if clean_url_for_visited in self.visited_urls:
-            return []
+        with self._lock:
+            if clean_url_for_visited in self.visited_urls:
+                return []
 
         try:
+            # Ask for the page conditionally when the cache knows it and its output still exists
+            cached = None
+            request_headers = {}
+            if self.cache and not self.refresh:
+                cached = self.cache.get(clean_url_for_visited)
+                if cached and (self.output_dir / cached["rel_path"]).exists():
+                    if cached["etag"]:
+                        request_headers["If-None-Match"] = cached["etag"]
+                    if cached["last_modified"]:
+                        request_headers["If-Modified-Since"] = cached["last_modified"]
+                else:
+                    cached = None
+
             self._log_verbose(f"Fetching: {url_to_process}", fg="yellow")
-            response = requests.get(url_to_process, timeout=15) # Increased timeout
+            response = self._fetch(url_to_process, request_headers, timings)
+            self.stats.count("bytes_downloaded", len(response.content))
+            if response.history:
+                self.stats.count("redirects")
             response.raise_for_status()
 
             final_url = response.url # URL after redirects
             parsed_final_url = urlparse(final_url)
             clean_final_url_for_visited = parsed_final_url._replace(fragment="", query="").geturl()
 
-            if final_url != url_to_process:
-                self._log_verbose(f"Redirected from {url_to_process} to {final_url}", fg="cyan")
-                # Mark original as visited if it wasn't the clean version
-                if clean_url_for_visited not in self.visited_urls:
-                    self.visited_urls.add(clean_url_for_visited)
-                # If the redirect target has already been visited (e.g. canonicalization)
-                if clean_final_url_for_visited in self.visited_urls:
-                    return []
-
-            self.visited_urls.add(clean_final_url_for_visited) # Add final, clean URL
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-            content_html = self.extract_content(soup)
-            title = self.get_page_title(soup)
-            markdown_content = self.converter.handle(content_html).strip()
+            with self._lock:
+                if final_url != url_to_process:
+                    self._log_verbose(f"Redirected from {url_to_process} to {final_url}", fg="cyan")
+                    # Mark original as visited if it wasn't the clean version
+                    if clean_url_for_visited not in self.visited_urls:
+                        self.frontier.mark_visited(clean_url_for_visited)
+                    # If the redirect target has already been visited (e.g. canonicalization)
+                    if clean_final_url_for_visited in self.visited_urls:
+                        self.stats.count("redirects_to_visited")
+                        return []
+
+                self.frontier.mark_visited(clean_final_url_for_visited) # Add final, clean URL
+
+            # Unchanged since the last run: a 304, or a 200 whose body hashes the same.
+            # Skip parsing, conversion and writing and reuse the links recorded last time.
+            body_hash = None
+            if cached and response.status_code != 304:
+                body_hash = hashlib.sha256(response.content).hexdigest()
+            if cached and (response.status_code == 304 or body_hash == cached["body_hash"]):
+                self.cache.touch(clean_url_for_visited)
+                with self._lock:
+                    self.unchanged_count += 1
+                self.stats.count("not_modified" if response.status_code == 304 else "unchanged_body")
+                self._log_verbose(f"Unchanged: {final_url} -> {self.output_dir / cached['rel_path']}", fg="cyan")
+                self._log_standard_progress("-")
+                return [link for link in cached["links"] if link not in self.visited_urls]
+
+            with stage_timer(timings, "parse"):
+                soup = BeautifulSoup(response.text, self.parser)
+            with stage_timer(timings, "extract"):
+                content_element = self.select_content(soup)
+                title = self.get_page_title(soup)
+            with stage_timer(timings, "convert"):
+                if self.engine == "direct":
+                    markdown_content = MarkdownEmitter().convert(content_element).strip()
+                else:
+                    markdown_content = self.converter.handle(str(content_element)).strip()
 
             rel_path = self.determine_path_from_url(final_url) # Use final URL for path determination
             output_path = self.output_dir / rel_path
 
-            if not self.dry_run:
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-
             if self.dry_run:
                 self._log_verbose(f"Dry-run: Would save {final_url} -> {output_path}", fg="blue")
                 self._log_standard_progress("o")
             else:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    # Add title as H1 if not already present as the first non-whitespace content
-                    if not markdown_content.startswith(f'# {title}') and not markdown_content.startswith('# '):
-                        f.write(f"# {title}\n\n")
-                    f.write(markdown_content + "\n") # Ensure newline at EOF
+                with stage_timer(timings, "write"):
+                    output_path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(output_path, 'w', encoding='utf-8') as f:
+                        # Add title as H1 if not already present as the first non-whitespace content
+                        if not markdown_content.startswith(f'# {title}') and not markdown_content.startswith('# '):
+                            f.write(f"# {title}\n\n")
+                        f.write(markdown_content + "\n") # Ensure newline at EOF
+                self.stats.count("bytes_written", len(markdown_content.encode("utf-8")))
                 self._log_verbose(f"Saved: {output_path}", fg="green")
                 self._log_standard_progress(".")
 
-            self.page_count += 1
-            new_urls_to_visit = []
-            for link_tag in soup.find_all('a', href=True):
-                href_value = link_tag['href']
-                if not href_value or href_value.startswith(('#', 'javascript:', 'mailto:')) or \
-                   any(ext in href_value.lower() for ext in [
-                       '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico',
-                       '.pdf', '.zip', '.tar.gz', '.tgz', '.rar', '.7z',
-                       '.css', '.js', '.json', '.xml', '.txt',
-                       '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
-                       '.mp4', '.webm', '.ogg', '.mp3', '.wav', '.avi', '.mov',
-                       '.woff', '.woff2', '.ttf', '.otf', '.eot'
-                   ]):
-                    continue
+            with self._lock:
+                self.page_count += 1
 
-                abs_href = urljoin(final_url, href_value) # Resolve relative to the page's final URL
-                parsed_abs_href = urlparse(abs_href)
-                clean_abs_href = parsed_abs_href._replace(fragment="", query="").geturl()
+            with stage_timer(timings, "links"):
+                page_links = self.extract_links(soup, final_url)
+            if self.cache:
+                self.cache.store(
+                    clean_url_for_visited,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    body_hash or hashlib.sha256(response.content).hexdigest(),
+                    rel_path.as_posix(),
+                    page_links,
+                )
 
-                if clean_abs_href.startswith(self.base_url_for_startswith_check) and \
-                   clean_abs_href not in self.visited_urls:
-                    new_urls_to_visit.append(clean_abs_href) # Add clean URL to queue
-
-            time.sleep(0.1) # Polite delay
-            return new_urls_to_visit
+            return [link for link in page_links if link not in self.visited_urls]
 
         except requests.exceptions.RequestException as e:
             self._log_error(f"Request error processing {url_to_process}: {str(e)}")
-            self.error_count += 1
+            if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+                self.stats.record_error(f"HTTP {e.response.status_code}")
+            else:
+                self.stats.record_error(type(e).__name__)
+            with self._lock:
+                self.error_count += 1
             return []
         except Exception as e:
             self._log_error(f"Error processing {url_to_process}: {type(e).__name__} - {str(e)}")
-            self.error_count += 1
+            self.stats.record_error(type(e).__name__)
+            with self._lock:
+                self.error_count += 1
             return []
 
+    def _complete_page(self, url, new_links):
+        for new_link in new_links:
+            self.frontier.push(new_link)
+        self.frontier.done(url) # After its links, so a checkpoint never loses them
+
+    def _counters(self):
+        with self._lock:
+            return {"pages": self.page_count, "errors": self.error_count, "unchanged": self.unchanged_count}
+
     def crawl(self):
         click.secho(f"Starting crawl of: {self.base_url_original}", bold=True)
         self._log_verbose(f"Normalized base URL for link checking: {self.base_url_for_startswith_check}")
         self._log_verbose(f"Normalized base path for output structure: {self.normalized_base_url_path}")
         self._log_verbose(f"Output directory: {self.output_dir}")
 
-        # Start queue with the URL used for startswith check
-        queue = [self.base_url_for_startswith_check]
-
-        # Use a set for faster `in` checks for items already added to queue
-        # This complements self.visited_urls which tracks successfully processed/attempted pages.
-        queued_urls = {self.base_url_for_startswith_check}
-
-        while queue:
-            current_url = queue.pop(0)
-            queued_urls.remove(current_url) # Remove from set as it's now being processed
-
-            # process_page handles the self.visited_urls check internally
-            new_links = self.process_page(current_url)
-
-            for new_link in new_links:
-                if new_link not in self.visited_urls and new_link not in queued_urls:
-                     queue.append(new_link)
-                     queued_urls.add(new_link)
+        if self.resume and self.frontier.visited:
+            click.secho(f"Resuming: {len(self.frontier.visited)} URLs already visited, {len(self.frontier)} queued.")
+        self._log_verbose(f"Concurrency: {self.concurrency}, parser: {self.parser}, engine: {self.engine}")
 
+        # Keep up to `concurrency` pages in flight. With a single worker this is the plain
+        # breadth-first loop; URLs stay queued in the frontier until their page has completed
+        # so an in-flight page is never scheduled twice.
+        completed_since_checkpoint = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            in_flight = {}
+            try:
+                while self.frontier or in_flight:
+                    while self.frontier and len(in_flight) < self.concurrency:
+                        current_url = self.frontier.pop()
+                        # process_page handles the self.visited_urls check internally
+                        in_flight[executor.submit(self.process_page, current_url)] = current_url
+
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._complete_page(in_flight.pop(future), future.result())
+                    completed_since_checkpoint += len(done)
+                    if completed_since_checkpoint >= self.checkpoint_every:
+                        self.frontier.checkpoint(self._counters())
+                        completed_since_checkpoint = 0
+            except KeyboardInterrupt:
+                # Let the pages in flight finish so the checkpoint reflects everything written
+                for future in wait(in_flight).done:
+                    self._complete_page(in_flight.pop(future), future.result())
+                self.frontier.checkpoint(self._counters())
+                self._log_standard_progress("", final_newline=True)
+                if self.cache:
+                    self.cache.close()
+                click.secho(f"\nCrawl interrupted after {self.page_count} pages.", bold=True)
+                if self.frontier.log_path:
+                    click.secho("Run again with --resume to continue where it stopped.")
+                raise SystemExit(130)
+
+        self.frontier.discard_log() # Completed; nothing left to resume
         self._log_standard_progress("", final_newline=True) # Ensure newline after dots
 
+        if self.cache:
+            removed = self.cache.compact()
+            self._log_verbose(f"Cache: dropped {removed} entries for pages no longer reachable")
+            self.cache.close()
+
         click.secho(f"\nCrawl completed:", bold=True)
         click.secho(f"Pages processed: {self.page_count}")
+        if self.cache:
+            click.secho(f"Pages unchanged (cached): {self.unchanged_count}")
         click.secho(f"Errors: {self.error_count}", fg="red" if self.error_count > 0 else None)
+        for host, rate in sorted(self.rate_limiter.rates().items()):
+            self._log_verbose(f"Final request rate for {host}: {rate:.1f}/s")
+
+        if self.stats_json:
+            self.stats.write_json(self.stats_json, mode="crawl", base_url=self.base_url_original,
+                                  concurrency=self.concurrency, parser=self.parser, engine=self.engine,
+                                  pages=self.page_count, unchanged=self.unchanged_count, error_count=self.error_count,
+                                  max_rps=self.rate_limiter.max_rps, final_rps=self.rate_limiter.rates())
+            click.secho(f"Stats written to {self.stats_json}")
+
+
+class LocalManifest:
+    """Source mtime/size/hash of every converted file plus the converter settings used.
+
+    Stored as JSON in the markdown folder; lets `local --incremental` reconvert only
+    changed files and remove the outputs of deleted sources.
+    """
+
+    FILENAME = ".html2md_manifest.json"
+
+    def __init__(self, md_base_folder, parser, engine):
+        self.path = md_base_folder / self.FILENAME
+        self.settings = {"html2text": HTML2TEXT_SETTINGS, "unwanted_selectors": LOCAL_UNWANTED_SELECTORS,
+                         "parser": parser, "engine": engine}
+        self.files = {}
+        self.settings_changed = False
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            # Different converter settings: every file counts as changed, but the old
+            # entries are kept so that orphaned outputs can still be found
+            self.settings_changed = data.get("settings") != self.settings
+
+    @staticmethod
+    def file_digest(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def check(self, rel_key, html_file_path, md_file):
+        """Return (unchanged, stat, digest); digest is only computed when mtime/size moved."""
+        stat = html_file_path.stat()
+        entry = self.files.get(rel_key)
+        if entry is None or self.settings_changed or not md_file.exists():
+            return False, stat, None
+        if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return True, stat, entry["sha256"]
+        digest = self.file_digest(html_file_path)
+        if digest == entry["sha256"]:
+            self.record(rel_key, stat, digest) # Touched but not edited
+            return True, stat, digest
+        return False, stat, digest
+
+    def record(self, rel_key, stat, digest):
+        self.files[rel_key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest}
+
+    def forget(self, rel_key):
+        return self.files.pop(rel_key, None) is not None
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+
+def _remove_orphaned_output(md_file, md_base_folder):
+    # Delete an output file and any directories it leaves empty
+    if md_file.exists():
+        md_file.unlink()
+    parent = md_file.parent
+    while parent != md_base_folder and parent.is_dir() and not any(parent.iterdir()):
+        parent.rmdir()
+        parent = parent.parent
+
+
+def convert_local_file(html_file_path, md_file, converter, parser, engine="html2text", timings=None):
+    # Per-stage durations are added to timings when a dict is passed in
+    timings = {} if timings is None else timings
+    with stage_timer(timings, "read"):
+        with open(html_file_path, "r", encoding="utf-8") as f_in:
+            html_content = f_in.read()
+
+    with stage_timer(timings, "parse"):
+        soup = BeautifulSoup(html_content, parser)
+    with stage_timer(timings, "extract"):
+        title = GitBookCrawler.get_page_title(None, soup) # Use static method if possible
+
+        # Simplified content extraction for local files; can be enhanced if needed
+        body_content = soup.body if soup.body else soup
+        remove_matching_elements(body_content, _LOCAL_UNWANTED_PATTERN)
+    with stage_timer(timings, "convert"):
+        if engine == "direct":
+            markdown_content = MarkdownEmitter().convert(body_content).strip()
+        else:
+            markdown_content = converter.handle(str(body_content)).strip()
+
+    with stage_timer(timings, "write"):
+        with open(md_file, "w", encoding="utf-8") as f_out:
+            if not markdown_content.startswith(f'# {title}') and not markdown_content.startswith('# '):
+                f_out.write(f"# {title}\n\n")
+            f_out.write(markdown_content + "\n")
+
+
+# Each --jobs worker process builds its html2text converter once and reuses it for every batch
+_worker_converter = None
+_worker_parser = None
+_worker_engine = None
+
+def _init_local_worker(parser, engine):
+    global _worker_converter, _worker_parser, _worker_engine
+    _worker_converter = make_html2text_converter()
+    _worker_parser = parser
+    _worker_engine = engine
+
+def _convert_local_batch(batch):
+    # Returns (error message or None, stage timings) per (html_file_path, md_file) pair
+    results = []
+    for html_file_path, md_file in batch:
+        timings = {}
+        try:
+            convert_local_file(html_file_path, md_file, _worker_converter, _worker_parser, _worker_engine, timings)
+            results.append((None, timings))
+        except Exception as e:
+            results.append((f"{type(e).__name__} - {str(e)}", timings))
+    return results
+
+
+def _run_local_conversions(tasks, jobs, verbose, parser, engine):
+    # Yields (html_file_path, md_file, error_message_or_None, stage_timings) in task order
+    if jobs <= 1 or len(tasks) <= 1:
+        converter = make_html2text_converter()
+        for html_file_path, md_file in tasks:
+            if verbose: click.secho(f"Converting: {html_file_path} -> {md_file}", fg="yellow")
+            timings = {}
+            try:
+                convert_local_file(html_file_path, md_file, converter, parser, engine, timings)
+                yield html_file_path, md_file, None, timings
+            except Exception as e:
+                yield html_file_path, md_file, f"{type(e).__name__} - {str(e)}", timings
+        return
+
+    # Hand files out in batches so each IPC round trip carries enough work, while keeping
+    # several batches per worker for load balancing.
+    batch_size = max(1, min(64, len(tasks) // (jobs * 4)))
+    batches = [tasks[i:i + batch_size] for i in range(0, len(tasks), batch_size)]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_local_worker, initargs=(parser, engine)) as executor:
+        for batch, results in zip(batches, executor.map(_convert_local_batch, batches)):
+            for (html_file_path, md_file), (error, timings) in zip(batch, results):
+                yield html_file_path, md_file, error, timings
 
 
-def convert_local_directory(folder_path_str, skip_existing=False, dry_run=False, verbose=False):
+def convert_local_directory(folder_path_str, skip_existing=False, dry_run=False, verbose=False, jobs=1,
+                            incremental=False, watch=False, parser=None, engine="html2text", stats_json=None):
     folder_path = Path(folder_path_str).resolve()
     md_base_folder = folder_path.parent / f"{folder_path.name}_md"
-
-    converter = html2text.HTML2Text()
-    converter.ignore_links = False
-    converter.ignore_images = False
-    converter.ignore_tables = False
-    converter.body_width = 0
-    converter.unicode_snob = True
-    converter.mark_code = True
+    incremental = incremental or watch
+    parser = parser or default_parser()
 
     total_files, html_files, converted_count, skipped_count, error_count = 0, 0, 0, 0, 0
+    unchanged_count, removed_count = 0, 0
     non_html_files = []
+    manifest = LocalManifest(md_base_folder, parser, engine) if incremental else None
+    seen_sources = set()
+    manifest_updates = {} # html_file_path -> (rel_key, stat, digest) for files about to be converted
+    stats = RunStats()
 
     click.secho(f"Scanning {folder_path} for HTML files...", bold=True)
     if verbose:
         click.secho(f"Markdown files will be saved to {md_base_folder}")
+        click.secho(f"HTML parser: {parser}, conversion engine: {engine}")
 
     if not dry_run and not md_base_folder.exists():
         md_base_folder.mkdir(parents=True, exist_ok=True)
@@ -344,12 +1490,15 @@ def convert_local_directory(folder_path_str, skip_existing=False, dry_run=False,
         click.echo(prefix, nl=False)
         progress_started_local = True
 
+    conversion_tasks = []
     for html_file_path in files_to_process:
         total_files += 1
         if html_file_path.suffix.lower() in (".html", ".htm"):
             html_files += 1
             rel_path = html_file_path.relative_to(folder_path)
             md_file = md_base_folder / rel_path.with_suffix(".md")
+            rel_key = rel_path.as_posix()
+            seen_sources.add(rel_key)
 
             if not dry_run:
                 md_file.parent.mkdir(parents=True, exist_ok=True)
@@ -359,50 +1508,62 @@ def convert_local_directory(folder_path_str, skip_existing=False, dry_run=False,
                 skipped_count += 1
                 continue
 
+            if manifest:
+                unchanged, stat, digest = manifest.check(rel_key, html_file_path, md_file)
+                if unchanged:
+                    if verbose: click.secho(f"Unchanged: {html_file_path} -> {md_file}", fg="cyan")
+                    unchanged_count += 1
+                    continue
+                manifest_updates[html_file_path] = (rel_key, stat, digest)
+
             if dry_run:
                 if verbose: click.secho(f"Dry-run: Would convert: {html_file_path} -> {md_file}", fg="blue")
                 if not verbose: click.echo("o", nl=False)
                 converted_count +=1 # Count as "would convert" for summary
                 continue
 
-            try:
-                if verbose: click.secho(f"Converting: {html_file_path} -> {md_file}", fg="yellow")
-                with open(html_file_path, "r", encoding="utf-8") as f_in:
-                    html_content = f_in.read()
-
-                soup = BeautifulSoup(html_content, 'html.parser')
-                title = GitBookCrawler.get_page_title(None, soup) # Use static method if possible
-
-                # Simplified content extraction for local files; can be enhanced if needed
-                body_content = soup.body if soup.body else soup
-                if body_content:
-                    for unwanted_selector in ["nav", "header", "footer", "aside"]:
-                        for element in body_content.select(unwanted_selector): element.decompose()
-                    html_to_convert = str(body_content)
-                else:
-                    html_to_convert = html_content
-
-                markdown_content = converter.handle(html_to_convert).strip()
-
-                with open(md_file, "w", encoding="utf-8") as f_out:
-                    if not markdown_content.startswith(f'# {title}') and not markdown_content.startswith('# '):
-                        f_out.write(f"# {title}\n\n")
-                    f_out.write(markdown_content + "\n")
-
-                if verbose: click.secho(f"Converted: {html_file_path} -> {md_file}", fg="green")
-                if not verbose: click.echo(".", nl=False)
-                converted_count += 1
-            except Exception as e:
-                if progress_started_local and not verbose: click.echo() # Newline for error
-                click.secho(f"Error converting {html_file_path}: {type(e).__name__} - {str(e)}", fg="red", err=True)
-                error_count += 1
-                if progress_started_local and not verbose: # Restart prefix if needed
-                    click.echo(prefix, nl=False)
+            conversion_tasks.append((html_file_path, md_file))
         else:
             non_html_files.append(html_file_path)
 
+    if verbose and jobs > 1 and conversion_tasks:
+        click.secho(f"Converting {len(conversion_tasks)} files with {jobs} worker processes")
+
+    for html_file_path, md_file, error, timings in _run_local_conversions(conversion_tasks, jobs, verbose, parser, engine):
+        stats.record_page(str(html_file_path), sum(timings.values()), timings)
+        if error is None:
+            stats.count("bytes_read", html_file_path.stat().st_size)
+            stats.count("bytes_written", md_file.stat().st_size)
+            if verbose: click.secho(f"Converted: {html_file_path} -> {md_file}", fg="green")
+            if not verbose: click.echo(".", nl=False)
+            converted_count += 1
+            if manifest:
+                rel_key, stat, digest = manifest_updates[html_file_path]
+                manifest.record(rel_key, stat, digest or LocalManifest.file_digest(html_file_path))
+        else:
+            if progress_started_local and not verbose: click.echo() # Newline for error
+            click.secho(f"Error converting {html_file_path}: {error}", fg="red", err=True)
+            stats.record_error(error.partition(" - ")[0])
+            error_count += 1
+            if progress_started_local and not verbose: # Restart prefix if needed
+                click.echo(prefix, nl=False)
+
     if progress_started_local and not verbose: click.echo() # Final newline for progress dots
 
+    if manifest:
+        # Sources that disappeared since the last run leave orphaned outputs behind
+        for rel_key in sorted(set(manifest.files) - seen_sources):
+            md_file = md_base_folder / Path(rel_key).with_suffix(".md")
+            if dry_run:
+                if verbose: click.secho(f"Dry-run: Would remove orphaned output: {md_file}", fg="blue")
+            else:
+                _remove_orphaned_output(md_file, md_base_folder)
+                manifest.forget(rel_key)
+                if verbose: click.secho(f"Removed orphaned output: {md_file}", fg="magenta")
+            removed_count += 1
+        if not dry_run:
+            manifest.save()
+
     click.secho(f"\n{'Dry run' if dry_run else 'Local conversion'} completed:", bold=True)
     click.secho(f"Total files scanned: {total_files}")
     click.secho(f"HTML files found: {html_files}")
@@ -411,6 +1572,9 @@ def convert_local_directory(folder_path_str, skip_existing=False, dry_run=False,
     else:
         click.secho(f"Files converted: {converted_count}")
     if skip_existing: click.secho(f"Files skipped (already exist): {skipped_count}")
+    if manifest:
+        click.secho(f"Files unchanged since last run: {unchanged_count}")
+        click.secho(f"Orphaned outputs {'that would be ' if dry_run else ''}removed: {removed_count}")
     click.secho(f"Files with errors: {error_count}", fg="red" if error_count > 0 else None)
     click.secho(f"Non-HTML files skipped: {len(non_html_files)}")
 
@@ -424,22 +1588,177 @@ def convert_local_directory(folder_path_str, skip_existing=False, dry_run=False,
             click.secho(f"{ext}: {len(f_list)} files", fg="magenta")
             for ex_file in f_list[:10]: click.secho(f"  - {ex_file.relative_to(folder_path.parent)}")
 
+    if stats_json:
+        stats.write_json(stats_json, mode="local", folder=str(folder_path), jobs=jobs, parser=parser, engine=engine,
+                         converted=converted_count, skipped=skipped_count, unchanged=unchanged_count,
+                         error_count=error_count, dry_run=dry_run)
+        click.secho(f"Stats written to {stats_json}")
+
+    if watch:
+        watch_local_directory(folder_path, md_base_folder, manifest, parser, engine)
+
+
+def _poll_local_changes(folder_path, interval):
+    # Fallback when watchdog is not installed: compare stat snapshots of the tree
+    def snapshot():
+        state = {}
+        for root, _, files in os.walk(folder_path):
+            for file in files:
+                path = Path(root) / file
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    previous = snapshot()
+    while True:
+        time.sleep(interval)
+        current = snapshot()
+        changed = {path for path, state in current.items() if previous.get(path) != state}
+        changed.update(set(previous) - set(current))
+        previous = current
+        if changed:
+            yield changed
+
+
+def _iter_local_changes(folder_path, interval=0.5):
+    # Yields sets of paths changed below folder_path, from filesystem events when possible
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        click.secho("watchdog is not installed; polling for changes instead.", fg="yellow")
+        yield from _poll_local_changes(folder_path, interval)
+        return
+
+    changed = set()
+    changed_lock = threading.Lock()
+
+    class ChangeHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            with changed_lock:
+                changed.add(Path(os.fsdecode(event.src_path)))
+                if getattr(event, "dest_path", None):
+                    changed.add(Path(os.fsdecode(event.dest_path)))
+
+    observer = Observer()
+    observer.schedule(ChangeHandler(), str(folder_path), recursive=True)
+    observer.start()
+    try:
+        while True:
+            time.sleep(interval) # Debounce bursts of events from editors and build tools
+            with changed_lock:
+                batch = set(changed)
+                changed.clear()
+            if batch:
+                yield batch
+    finally:
+        observer.stop()
+        observer.join()
+
+
+def watch_local_directory(folder_path, md_base_folder, manifest, parser, engine):
+    converter = make_html2text_converter() # Stays warm for the lifetime of the watch
+    click.secho(f"\nWatching {folder_path} for changes (Ctrl-C to stop)...", bold=True)
+    try:
+        for changed_paths in _iter_local_changes(folder_path):
+            for path in sorted(changed_paths):
+                if path.is_dir():
+                    continue # Files inside a new or moved directory are reported on their own
+                rel_path = path.relative_to(folder_path)
+                rel_key = rel_path.as_posix()
+                md_file = md_base_folder / rel_path.with_suffix(".md")
+
+                if not path.exists():
+                    # A deleted file, or a deleted directory and everything below it
+                    for known_key in [k for k in manifest.files if k == rel_key or k.startswith(rel_key + "/")]:
+                        orphan = md_base_folder / Path(known_key).with_suffix(".md")
+                        _remove_orphaned_output(orphan, md_base_folder)
+                        manifest.forget(known_key)
+                        click.secho(f"Removed: {orphan}", fg="magenta")
+                    continue
+
+                if path.suffix.lower() not in (".html", ".htm"):
+                    continue
+                try:
+                    unchanged, stat, digest = manifest.check(rel_key, path, md_file)
+                    if unchanged:
+                        continue
+                    md_file.parent.mkdir(parents=True, exist_ok=True)
+                    convert_local_file(path, md_file, converter, parser, engine)
+                    manifest.record(rel_key, stat, digest or LocalManifest.file_digest(path))
+                    click.secho(f"Converted: {path} -> {md_file}", fg="green")
+                except Exception as e:
+                    click.secho(f"Error converting {path}: {type(e).__name__} - {str(e)}", fg="red", err=True)
+            manifest.save()
+    except KeyboardInterrupt:
+        manifest.save()
+        click.secho("\nStopped watching.", bold=True)
+
+
+def _start_profiler(profile_path):
+    # Profiles the main thread; returns a callable that stops profiling and writes the report
+    if profile_path.endswith(".html"):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            click.secho("pyinstrument is not installed; writing a cProfile report instead.", fg="yellow")
+            profile_path = profile_path[:-len(".html")] + ".prof"
+        else:
+            profiler = Profiler()
+            profiler.start()
+            def stop():
+                profiler.stop()
+                with open(profile_path, "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+                click.secho(f"Profile written to {profile_path}")
+            return stop
+
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    def stop():
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        click.secho(f"Profile written to {profile_path} (view with: python -m pstats {profile_path})")
+    return stop
+
 
 @click.group(invoke_without_command=True)
+@click.option("--profile", "profile_path", type=click.Path(dir_okay=False, writable=True), default=None,
+              help="Profile the run and write the report to this path (.prof for cProfile, .html for pyinstrument).")
 @click.pass_context
-def cli(ctx):
+def cli(ctx, profile_path):
     """Convert HTML to Markdown from local directories or GitBook URLs."""
     if ctx.invoked_subcommand is None:
         click.echo(ctx.get_help())
+    elif profile_path:
+        ctx.call_on_close(_start_profiler(profile_path))
 
 @cli.command("local")
 @click.argument("directory", type=click.Path(exists=True, file_okay=False, dir_okay=True, resolve_path=True))
 @click.option("--skip-existing", is_flag=True, help="Skip conversion if markdown file already exists.")
 @click.option("--dry-run", is_flag=True, help="Print files that would be converted without actual conversion.")
 @click.option("--verbose", "-v", is_flag=True, help="Show detailed information about processed files.")
-def local_command(directory, skip_existing, dry_run, verbose):
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=1, show_default=True,
+              help="Number of worker processes converting files in parallel.")
+@click.option("--incremental", is_flag=True,
+              help="Only reconvert files changed since the last run and remove outputs of deleted files.")
+@click.option("--watch", is_flag=True, help="After converting, keep running and reconvert files as they change.")
+@click.option("--parser", type=click.Choice(PARSER_BACKENDS), default=None,
+              help="HTML parser backend. Defaults to the fastest one installed (lxml, else html.parser).")
+@click.option("--engine", type=click.Choice(CONVERSION_ENGINES), default="html2text", show_default=True,
+              help="Markdown conversion engine. 'direct' writes Markdown from the parsed tree without re-parsing.")
+@click.option("--stats-json", type=click.Path(dir_okay=False, writable=True), default=None,
+              help="Write per-stage timings, byte counts, errors and the slowest pages to this JSON file.")
+def local_command(directory, skip_existing, dry_run, verbose, jobs, incremental, watch, parser, engine, stats_json):
     """Convert HTML files from a local directory to Markdown."""
-    convert_local_directory(directory, skip_existing, dry_run, verbose)
+    if watch and dry_run:
+        raise click.UsageError("--watch cannot be combined with --dry-run.")
+    convert_local_directory(directory, skip_existing, dry_run, verbose, jobs, incremental, watch, parser, engine,
+                            stats_json)
 
 @cli.command("gitbook")
 @click.argument("url")
@@ -447,9 +1766,29 @@ def local_command(directory, skip_existing, dry_run, verbose):
               help="Folder name in current location to save markdown files. Defaults to 'gitbook_md'.")
 @click.option("--dry-run", is_flag=True, help="Print what would be done without actually doing it.")
 @click.option("--verbose", "-v", is_flag=True, help="Show detailed information, including link processing.")
-def gitbook_command(url, folder_name, dry_run, verbose):
+@click.option("--concurrency", "-c", type=click.IntRange(min=1), default=1, show_default=True,
+              help="Number of pages fetched and converted in parallel.")
+@click.option("--max-per-host", type=click.IntRange(min=1), default=None,
+              help="Maximum open connections per host. Defaults to the concurrency.")
+@click.option("--refresh", is_flag=True, help="Ignore the HTTP cache and download every page again.")
+@click.option("--resume", is_flag=True, help="Continue an interrupted crawl from its last checkpoint.")
+@click.option("--checkpoint-every", type=click.IntRange(min=1), default=100, show_default=True,
+              help="Number of pages between crawl state checkpoints.")
+@click.option("--parser", type=click.Choice(PARSER_BACKENDS), default=None,
+              help="HTML parser backend. Defaults to the fastest one installed (lxml, else html.parser).")
+@click.option("--engine", type=click.Choice(CONVERSION_ENGINES), default="html2text", show_default=True,
+              help="Markdown conversion engine. 'direct' writes Markdown from the parsed tree without re-parsing.")
+@click.option("--stats-json", type=click.Path(dir_okay=False, writable=True), default=None,
+              help="Write per-stage timings, byte counts, errors and the slowest pages to this JSON file.")
+@click.option("--max-rps", type=click.FloatRange(min=0.2), default=20.0, show_default=True,
+              help="Upper bound on requests per second to each host. The rate adapts below it.")
+@click.option("--max-retries", type=click.IntRange(min=0), default=4, show_default=True,
+              help="Retries for timeouts, connection errors, 429 and 5xx responses, with jittered backoff.")
+def gitbook_command(url, folder_name, dry_run, verbose, concurrency, max_per_host, refresh, resume, checkpoint_every,
+                    parser, engine, stats_json, max_rps, max_retries):
     """Crawl a GitBook URL and convert pages to Markdown, maintaining relative subdirectories."""
-    crawler = GitBookCrawler(url, folder_name, verbose, dry_run)
+    crawler = GitBookCrawler(url, folder_name, verbose, dry_run, concurrency, max_per_host, refresh,
+                             resume, checkpoint_every, parser, engine, stats_json, max_rps, max_retries)
     crawler.crawl()
 
 if __name__ == "__main__":